@@ -6,10 +6,15 @@ import logging
 import logging.handlers
 import os
 import pathlib
+import time
 import typing
 
 from box import Box
 
+from auto.json_logging import BatchingHandler, JsonLinesFormatter
+from auto.retry import CircuitBreaker
+from auto.tracing import Tracer
+
 class ConfigVerificationError(ValueError):
     ''' Base class for config verification errors '''
     pass
@@ -22,6 +27,10 @@ class ConfigValueTypeIncorrectError(ConfigVerificationError):
     ''' A value exists but is not the expected type '''
     pass
 
+class ConfigValueInvalidError(ConfigVerificationError):
+    ''' A value exists and has the expected type but is not in the allowed range '''
+    pass
+
 class NoDefault:
     pass
 
@@ -35,6 +44,10 @@ class AutoConfig:
         Takes in a path (to yaml file) or a dict to parse the config from
         If verification is True, check that required keys (with appropriate values in the config)
         '''
+        self._tracer = None
+        self._circuit_breaker = None
+        load_start = time.perf_counter()
+
         if isinstance(path_or_dict, pathlib.Path):
             self._dict = Box.from_yaml(filename=path_or_dict)
         else:
@@ -42,6 +55,7 @@ class AutoConfig:
 
         if verify:
             self.verify_config()
+            self.get_tracer().record('config.load', load_start, time.perf_counter())
 
     @classmethod
     def _is_key_in_config_dict(cls, key: str, typ: typing.Union[typing.Type, tuple], config: dict, default=NoDefault):
@@ -76,6 +90,7 @@ class AutoConfig:
         auto_config = self._dict['auto_config']
         self._is_key_in_config_dict('watcher', dict, auto_config)
         self._is_key_in_config_dict('executor', dict, auto_config)
+        self._is_key_in_config_dict('tracing', dict, auto_config, default={})
 
         # watcher verification
         watcher_config = auto_config['watcher']
@@ -88,6 +103,9 @@ class AutoConfig:
         self._is_key_in_config_dict('log_max_size_bytes', (type(None), int), watcher_config)
         self._is_key_in_config_dict('log_max_rotations_to_save', (type(None), int), watcher_config)
         self._is_key_in_config_dict('log_format', (type(None), str), watcher_config)
+        self._is_key_in_config_dict('log_structured', bool, watcher_config, default=False)
+        self._is_key_in_config_dict('log_batch_size', (type(None), int), watcher_config, default=None)
+        self._is_key_in_config_dict('log_batch_max_latency_seconds', (type(None), int, float), watcher_config, default=None)
 
         # executor verification
         executor_config = auto_config['executor']
@@ -100,6 +118,31 @@ class AutoConfig:
         self._is_key_in_config_dict('log_max_size_bytes', (type(None), int), executor_config)
         self._is_key_in_config_dict('log_max_rotations_to_save', (type(None), int), executor_config)
         self._is_key_in_config_dict('log_format', (type(None), str), executor_config)
+        self._is_key_in_config_dict('log_structured', bool, executor_config, default=False)
+        self._is_key_in_config_dict('log_batch_size', (type(None), int), executor_config, default=None)
+        self._is_key_in_config_dict('log_batch_max_latency_seconds', (type(None), int, float), executor_config, default=None)
+        self._is_key_in_config_dict('workers', (type(None), list), executor_config, default=None)
+        self._is_key_in_config_dict('worker_authkey', (type(None), str), executor_config, default=None)
+        self._is_key_in_config_dict('retry_count', (type(None), int), executor_config, default=None)
+        self._is_key_in_config_dict('retry_backoff_seconds', (type(None), int, float), executor_config, default=None)
+        self._is_key_in_config_dict('retry_backoff_max_seconds', (type(None), int, float), executor_config, default=None)
+        self._is_key_in_config_dict('circuit_breaker_failure_rate', (type(None), int, float), executor_config, default=None)
+        self._is_key_in_config_dict('circuit_breaker_window', (type(None), int), executor_config, default=None)
+        self._is_key_in_config_dict('circuit_breaker_reset_seconds', (type(None), int, float), executor_config, default=None)
+
+        failure_rate = executor_config['circuit_breaker_failure_rate']
+        if failure_rate is not None and not 0 < failure_rate <= 1:
+            raise ConfigValueInvalidError(f"circuit_breaker_failure_rate's value {failure_rate} must be greater than 0 and at most 1")
+        window = executor_config['circuit_breaker_window']
+        if window is not None and window < 1:
+            raise ConfigValueInvalidError(f"circuit_breaker_window's value {window} must be at least 1")
+
+        # tracing verification (the entire section is optional)
+        tracing_config = auto_config['tracing']
+        self._is_key_in_config_dict('enable', bool, tracing_config, default=False)
+        self._is_key_in_config_dict('profile', bool, tracing_config, default=False)
+        self._is_key_in_config_dict('tracemalloc', bool, tracing_config, default=False)
+        self._is_key_in_config_dict('output_directory', (type(None), str), tracing_config, default=None)
 
     def get_component_logger(self, component: str) -> logging.Logger:
         ''' Gets a logger object for the given component '''
@@ -112,7 +155,10 @@ class AutoConfig:
         logger = logging.getLogger(name=f'auto.{component}')
 
         # not clearing handlers would lead to double, etc prints if this function is called
-        # multiple times.
+        # multiple times. Close batching handlers first so buffered records aren't lost.
+        for handler in logger.handlers:
+            if isinstance(handler, BatchingHandler):
+                handler.close()
         logger.handlers.clear()
 
         if config.log_directory:
@@ -127,8 +173,19 @@ class AutoConfig:
         else:
             handler = logging.StreamHandler()
 
-        if handler not in logger.handlers:
+        if config.get('log_structured', False):
+            handler.setFormatter(JsonLinesFormatter())
+
+            # batch writes, writing every log_batch_size records, on an error, or
+            # log_batch_max_latency_seconds after the first record of a batch
+            batch_size = config.get('log_batch_size', None) or 100
+            max_latency = config.get('log_batch_max_latency_seconds', None)
+            if batch_size > 1:
+                handler = BatchingHandler(batch_size, handler, max_latency_seconds=max_latency if max_latency is not None else 1)
+        else:
             handler.setFormatter(logging.Formatter(config.log_format or '%(asctime)s - %(name)s:%(lineno)d - %(levelname)s - %(message)s'))
+
+        if handler not in logger.handlers:
             logger.addHandler(handler)
 
         if config.log_level is not None:
@@ -144,3 +201,18 @@ class AutoConfig:
         ''' Returns a Box corresponding with the executor config settings '''
         return self._dict['auto_config']['executor']
 
+    def get_tracing_config(self) -> Box:
+        ''' Returns a Box corresponding with the tracing config settings (the section is optional) '''
+        return Box(self._dict['auto_config'].get('tracing', {}))
+
+    def get_tracer(self) -> Tracer:
+        ''' Gets the (shared) Tracer for this config, creating it on first use '''
+        if self._tracer is None:
+            self._tracer = Tracer.from_config(self.get_tracing_config())
+        return self._tracer
+
+    def get_circuit_breaker(self) -> CircuitBreaker:
+        ''' Gets the (shared) CircuitBreaker for this config, creating it on first use '''
+        if self._circuit_breaker is None:
+            self._circuit_breaker = CircuitBreaker.from_config(self.get_executor_config())
+        return self._circuit_breaker
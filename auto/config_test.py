@@ -8,6 +8,7 @@ import uuid
 from box import Box
 
 from auto.config import *
+from auto.json_logging import BatchingHandler
 
 @pytest.fixture(scope='function')
 def valid_auto_config(tmpdir):
@@ -114,6 +115,30 @@ def test_get_component_logger_with_options(valid_auto_config, tmpdir, mock_loggi
     assert handler.backupCount == 8
     assert handler.maxBytes == 1200
 
+def test_get_component_logger_structured(valid_auto_config, tmpdir, mock_logging_get_logger):
+    valid_auto_config._dict.auto_config.executor.log_directory = str(tmpdir)
+    valid_auto_config._dict.auto_config.executor.log_structured = True
+    valid_auto_config._dict.auto_config.executor.log_batch_size = 10
+
+    logger = valid_auto_config.get_component_logger('executor')
+    assert len(logger.handlers) == 1
+    handler = logger.handlers[0]
+    assert isinstance(handler, BatchingHandler)
+    assert handler.capacity == 10
+    assert handler.max_latency_seconds == 1
+    assert isinstance(handler.target.formatter, JsonLinesFormatter)
+
+    logger.warning('hi')
+    log_file = pathlib.Path(tmpdir) / 'log.txt'
+    assert log_file.read_text() == ''
+
+    # recreating the logger flushes the batched records
+    valid_auto_config._dict.auto_config.executor.log_batch_size = 1
+    with patch.object(auto.config.logging, 'getLogger', return_value=logger):
+        logger = valid_auto_config.get_component_logger('executor')
+    assert isinstance(logger.handlers[0].formatter, JsonLinesFormatter)
+    assert '"message":"hi"' in log_file.read_text()
+
 def test_get_watcher_config(valid_auto_config, tmpdir):
     polldir = pathlib.Path(tmpdir)
     assert valid_auto_config.get_watcher_config() == Box({
@@ -126,6 +151,9 @@ def test_get_watcher_config(valid_auto_config, tmpdir):
         'log_max_size_bytes': None,
         'log_max_rotations_to_save': None,
         'log_format': None,
+        'log_structured': False,
+        'log_batch_size': None,
+        'log_batch_max_latency_seconds': None,
     })
 
 def test_get_executor_config(valid_auto_config, tmpdir):
@@ -140,4 +168,56 @@ def test_get_executor_config(valid_auto_config, tmpdir):
         'log_max_size_bytes': None,
         'log_max_rotations_to_save': None,
         'log_format': None,
+        'log_structured': False,
+        'log_batch_size': None,
+        'log_batch_max_latency_seconds': None,
+        'workers': None,
+        'worker_authkey': None,
+        'retry_count': None,
+        'retry_backoff_seconds': None,
+        'retry_backoff_max_seconds': None,
+        'circuit_breaker_failure_rate': None,
+        'circuit_breaker_window': None,
+        'circuit_breaker_reset_seconds': None,
+    })
+
+def test_get_tracing_config_defaults(valid_auto_config):
+    assert valid_auto_config.get_tracing_config() == Box({
+        'enable': False,
+        'profile': False,
+        'tracemalloc': False,
+        'output_directory': None,
     })
+
+def test_get_tracer(valid_auto_config):
+    tracer = valid_auto_config.get_tracer()
+    assert isinstance(tracer, Tracer)
+    assert not tracer.enable
+    assert valid_auto_config.get_tracer() is tracer
+
+def test_get_tracer_without_verification():
+    ac = AutoConfig({'auto_config': {'executor': {}}}, verify=False)
+    assert ac.get_tracing_config() == Box({})
+    assert not ac.get_tracer().enable
+
+def test_init_records_config_load_span(valid_auto_config):
+    valid_auto_config._dict.auto_config.tracing.enable = True
+    ac = AutoConfig(valid_auto_config._dict.to_dict())
+    assert [s.name for s in ac.get_tracer().recent_spans] == ['config.load']
+
+@pytest.mark.parametrize('key,value', [
+    ('circuit_breaker_failure_rate', 0),
+    ('circuit_breaker_failure_rate', -1),
+    ('circuit_breaker_failure_rate', 1.1),
+    ('circuit_breaker_window', 0),
+])
+def test_verify_config_circuit_breaker_values(valid_auto_config, key, value):
+    valid_auto_config._dict.auto_config.executor[key] = value
+    with pytest.raises(ConfigValueInvalidError):
+        valid_auto_config.verify_config()
+
+def test_get_circuit_breaker(valid_auto_config):
+    circuit_breaker = valid_auto_config.get_circuit_breaker()
+    assert isinstance(circuit_breaker, CircuitBreaker)
+    assert not circuit_breaker.enable
+    assert valid_auto_config.get_circuit_breaker() is circuit_breaker
@@ -0,0 +1,313 @@
+'''
+Home to distributed execution for Auto.
+
+A coordinator (RemoteExecutor) pushes the run_path to one of the configured workers.
+The worker resolves the command itself, exactly like a local Executor would (with its
+own PATHEXT, Python interpreter and shebang parsing), runs it with the coordinator's
+max runtime and streams output lines and the exit code back.
+
+The run_path is not copied: it must exist at the same path on every worker
+(for example via a shared filesystem or identical layout on every node).
+
+Each worker runs one job at a time. A busy worker answers {"busy": true} right away,
+so the coordinator moves on to the next worker, and waits for one to free up if they
+are all busy.
+
+The protocol is JSON messages sent over multiprocessing.connection:
+    coordinator -> worker: {"run_path": str, "max_runtime_seconds": int}
+    worker -> coordinator: {"busy": true}, or {"accepted": true} followed by
+                           {"output": str, "offset": int} (one per line), then {"exit_code": int} or {"error": str}
+'''
+import argparse
+import itertools
+import json
+import multiprocessing.connection
+import os
+import pathlib
+import tempenv
+import threading
+import time
+import typing
+import uuid
+
+from auto.config import AutoConfig, ConfigKeyMissingError
+from auto.executor import Executor
+
+# Shared by every RemoteExecutor so that jobs are spread round-robin across workers.
+_worker_counter = itertools.count()
+
+# How long to wait before asking the workers again when they are all busy.
+_ALL_WORKERS_BUSY_SLEEP_SECONDS = .05
+
+# How long past the max runtime (or for the initial reply) to wait on a worker
+# before giving up on it as hung or unreachable.
+_WORKER_GRACE_SECONDS = 30
+
+# The exit code used for a job whose worker failed or went away, so that it counts
+# as a failure (and can be retried) like any other.
+WORKER_FAILURE_EXIT_CODE = -1
+
+class WorkerError(RuntimeError):
+    ''' A worker failed to run a job or went away in the middle of one '''
+    pass
+
+class _WorkerBusyError(Exception):
+    ''' The worker is already running a job '''
+    pass
+
+def parse_address(address: str) -> typing.Tuple[str, int]:
+    ''' Parses a host:port string into a (host, port) tuple '''
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+def _get_authkey(config: AutoConfig) -> bytes:
+    '''
+    Gets the authkey (as bytes) used between coordinator and workers.
+
+    Workers run whatever they are sent, so a key is required: without one
+    multiprocessing.connection would accept unauthenticated connections.
+    '''
+    authkey = config.get_executor_config().get('worker_authkey', None)
+    if not authkey:
+        raise ConfigKeyMissingError("worker_authkey must be set in the executor config to use workers")
+    return authkey.encode()
+
+def _send(connection: multiprocessing.connection.Connection, message: dict):
+    ''' Sends a JSON message on the connection '''
+    connection.send_bytes(json.dumps(message).encode())
+
+def _recv(connection: multiprocessing.connection.Connection, timeout: typing.Optional[float]=None) -> dict:
+    '''
+    Receives a JSON message from the connection.
+    If a timeout is given and nothing arrives in time, a TimeoutError is raised.
+    '''
+    if timeout is not None and not connection.poll(max(0, timeout)):
+        raise TimeoutError(f"No message received within {timeout} seconds")
+    return json.loads(connection.recv_bytes().decode())
+
+class RemoteExecutor(Executor):
+    '''
+    An Executor that, instead of running the run_path itself, sends it to
+    one of the workers in the executor config.
+
+    Retries and the circuit breaker are handled here, on the coordinator. If the worker
+    fails or goes away mid-job, the attempt fails with WORKER_FAILURE_EXIT_CODE so that it
+    is retried (on the next worker) like any other failure.
+    If no worker can be reached, the run_path is run locally.
+    '''
+    def __init__(self, config: AutoConfig, run_path: pathlib.Path):
+        '''
+        Initializer. Same as Executor's, but raises a ConfigKeyMissingError
+        if worker_authkey is not set.
+        '''
+        Executor.__init__(self, config, run_path)
+        self.authkey = _get_authkey(config)
+
+    def get_workers(self) -> typing.List[str]:
+        ''' Gets the list of host:port worker addresses from the config '''
+        return self.config.get_executor_config().get('workers', None) or []
+
+    def _execute_once(self, pathext: typing.List[str]) -> int:
+        '''
+        Sends the run_path to a worker. Output streamed back from the worker
+        will be logged to the logger.
+        '''
+        workers = self.get_workers()
+        while True:
+            any_busy = False
+            start = next(_worker_counter)
+            for i in range(len(workers)):
+                address = workers[(start + i) % len(workers)]
+                try:
+                    connection = multiprocessing.connection.Client(parse_address(address), authkey=self.authkey)
+                except OSError as ex:
+                    self.logger.info(f"Unable to reach worker {address}: {ex}")
+                    continue
+
+                try:
+                    with connection, self.tracer.span('executor.remote.dispatch'):
+                        return self._run_on_worker(connection, address)
+                except _WorkerBusyError:
+                    self.logger.debug(f"Worker {address} is busy.")
+                    any_busy = True
+                except WorkerError as ex:
+                    self.logger.info(f"{ex}")
+                    self.logger.info(f".. Exit Code: {WORKER_FAILURE_EXIT_CODE}")
+                    return WORKER_FAILURE_EXIT_CODE
+
+            if not any_busy:
+                break
+
+            # every reachable worker is running a job: wait for one to free up
+            with self.tracer.span('executor.remote.wait_for_worker'):
+                time.sleep(_ALL_WORKERS_BUSY_SLEEP_SECONDS)
+
+        self.logger.info("No worker could be reached, executing locally.")
+        return Executor._execute_once(self, pathext)
+
+    def _run_on_worker(self, connection: multiprocessing.connection.Connection, address: str) -> int:
+        ''' Sends the job on the given connection and waits for the result '''
+        max_runtime = self.get_process_max_runtime_seconds()
+        _send(connection, {
+            'run_path': str(self.run_path),
+            'max_runtime_seconds': max_runtime,
+        })
+
+        try:
+            reply = _recv(connection, _WORKER_GRACE_SECONDS)
+        except (EOFError, OSError) as ex:
+            raise WorkerError(f"Lost connection to worker {address} before running {self.run_path}: {ex!r}") from ex
+        if reply.get('busy'):
+            raise _WorkerBusyError(address)
+
+        self.run_id = uuid.uuid4().hex
+        self.pid = None
+        self.logger.info(f"Executing on worker {address}: {self.run_path}...")
+
+        # the worker kills the process at max_runtime, so if nothing is back by then
+        # (plus some grace) the worker is hung or unreachable
+        deadline = time.time() + max_runtime + _WORKER_GRACE_SECONDS
+        while True:
+            try:
+                message = _recv(connection, deadline - time.time())
+            except (EOFError, OSError) as ex:
+                raise WorkerError(f"Lost connection to worker {address} while running {self.run_path}: {ex!r}") from ex
+
+            if 'output' in message:
+                self._handle_output_line(message['output'], message.get('offset'))
+            elif 'exit_code' in message:
+                exit_code = message['exit_code']
+                self.logger.info(f".. Exit Code: {exit_code}")
+                for handler in self.logger.handlers:
+                    handler.flush()
+                return exit_code
+            else:
+                raise WorkerError(f"Worker {address} failed to run {self.run_path}: {message.get('error')}")
+
+class _JobExecutor(Executor):
+    '''
+    The worker-side Executor for a single job. Resolves and runs the command for the
+    run_path it was given and streams output back over the connection in addition to logging it.
+    '''
+    def __init__(self, config: AutoConfig, job: dict, connection: multiprocessing.connection.Connection):
+        ''' Initializer. Takes in the worker's AutoConfig, the job sent by the coordinator and the connection it came on '''
+        self._job = job
+        self._connection = connection
+        Executor.__init__(self, config, pathlib.Path(job['run_path']))
+
+    def _resolve_run_path(self, run_path: pathlib.Path) -> pathlib.Path:
+        ''' The coordinator already resolved the run_path, so use it as is '''
+        return run_path
+
+    def get_process_max_runtime_seconds(self) -> int:
+        ''' The coordinator decides the max runtime so it matches a local execution '''
+        return self._job['max_runtime_seconds']
+
+    def _handle_output_line(self, line: str, offset: typing.Optional[int]=None):
+        ''' Logs the line locally and sends it back to the coordinator '''
+        Executor._handle_output_line(self, line, offset)
+        _send(self._connection, {'output': line, 'offset': offset})
+
+    def execute(self) -> int:
+        ''' Resolves and runs the job's command once (the coordinator handles retries) '''
+        with self.tracer.run(str(self.run_path)):
+            pathext = self.get_pathext()
+            with tempenv.TemporaryEnvironment({'PATHEXT' : os.pathsep.join(pathext)}):
+                return Executor._execute_once(self, pathext)
+
+class Worker:
+    '''
+    A Worker listens on the given address for jobs from a coordinator and runs them one at a time.
+    Jobs that arrive while one is running are answered with a busy reply.
+
+    To use several cores on one node, run several workers.
+    '''
+    def __init__(self, config: AutoConfig, address: typing.Tuple[str, int]):
+        '''
+        Initializer. Takes in an AutoConfig (used for the execution directory and logging)
+        and an address to listen on. Port 0 picks a free port (see .address).
+
+        Raises a ConfigKeyMissingError if worker_authkey is not set.
+        '''
+        self.config = config
+        self.logger = config.get_component_logger('executor')
+        self.listener = multiprocessing.connection.Listener(address, authkey=_get_authkey(config))
+        self._busy = threading.Lock()
+
+    @property
+    def address(self) -> typing.Tuple[str, int]:
+        ''' The address this worker is listening on '''
+        return self.listener.address
+
+    def handle_connection(self, connection: multiprocessing.connection.Connection):
+        ''' Reads a single job from the connection, runs it, and sends back the result '''
+        with connection:
+            try:
+                job = _recv(connection)
+            except (EOFError, OSError, ValueError) as ex:
+                self.logger.info(f"Unable to read job: {ex}")
+                return
+
+            if not self._busy.acquire(blocking=False):
+                _send(connection, {'busy': True})
+                return
+
+            try:
+                _send(connection, {'accepted': True})
+                try:
+                    exit_code = _JobExecutor(self.config, job, connection).execute()
+                except Exception as ex:
+                    self.logger.exception(f"Failed to run job: {job}")
+                    _send(connection, {'error': repr(ex)})
+                else:
+                    _send(connection, {'exit_code': exit_code})
+            finally:
+                self._busy.release()
+
+    def _serve_connection(self, connection: multiprocessing.connection.Connection):
+        ''' Runs in a thread per connection so that busy replies don't wait on a running job '''
+        try:
+            self.handle_connection(connection)
+        except (EOFError, OSError) as ex:
+            self.logger.info(f"Lost connection to coordinator: {ex}")
+
+    def serve_forever(self):
+        ''' Accepts and runs jobs until close() is called '''
+        self.logger.info(f"Worker listening on: {self.address}")
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                # the listener was closed
+                break
+            except multiprocessing.AuthenticationError as ex:
+                self.logger.info(f"Rejected connection: {ex}")
+                continue
+
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def close(self):
+        ''' Stops listening for jobs '''
+        self.listener.close()
+
+def create_executor(config: AutoConfig, run_path: pathlib.Path) -> Executor:
+    ''' Creates a RemoteExecutor if workers are configured, otherwise a regular Executor '''
+    if config.get_executor_config().get('workers', None):
+        return RemoteExecutor(config, run_path)
+    return Executor(config, run_path)
+
+def main():
+    ''' Entry point to run a worker: python -m auto.distributed <config> <host:port> '''
+    parser = argparse.ArgumentParser(description='Runs an Auto worker that executes jobs sent by a coordinator')
+    parser.add_argument('config', type=pathlib.Path, help='path to the yaml config to use for this worker')
+    parser.add_argument('address', help='host:port to listen on')
+    args = parser.parse_args()
+
+    worker = Worker(AutoConfig(args.config), parse_address(args.address))
+    try:
+        worker.serve_forever()
+    finally:
+        worker.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import auto.distributed
+import auto.executor
+import multiprocessing.connection
+import pathlib
+import pytest
+import threading
+import time
+
+from auto.config import AutoConfig, ConfigKeyMissingError
+from auto.distributed import _JobExecutor, RemoteExecutor, Worker, WORKER_FAILURE_EXIT_CODE, create_executor, parse_address
+from auto.executor import Executor, PROCESS_LOG_LINE_PREFIX
+from .config_test import valid_auto_config
+from .executor_test import py_file
+from unittest.mock import MagicMock, patch
+
+def _run_worker(config_dict, address_queue):
+    ''' Target for worker processes '''
+    worker = Worker(AutoConfig(config_dict), ('127.0.0.1', 0))
+    address_queue.put(worker.address)
+    worker.serve_forever()
+
+@pytest.fixture(scope='function')
+def distributed_config(valid_auto_config, tmpdir):
+    exec_config = valid_auto_config._dict.auto_config.executor
+    exec_config.execution_directory = str(tmpdir)
+    exec_config.max_process_runtime_seconds = 5
+    exec_config.worker_authkey = 'secret'
+    yield valid_auto_config
+
+@pytest.fixture(scope='function')
+def worker_processes(distributed_config):
+    address_queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_run_worker, args=(distributed_config._dict.to_dict(), address_queue), daemon=True) for _ in range(3)]
+    for process in processes:
+        process.start()
+
+    addresses = [address_queue.get(timeout=30) for _ in processes]
+    distributed_config._dict.auto_config.executor.workers = [f'{host}:{port}' for host, port in addresses]
+    yield processes
+
+    for process in processes:
+        process.terminate()
+        process.join()
+
+def _capture_output(executor):
+    logger = MagicMock()
+    log_lines = []
+    logger.info = lambda x: log_lines.append(x)
+    logger.debug = lambda x: log_lines.append(x)
+    executor.logger = logger
+    return log_lines
+
+def test_parse_address():
+    assert parse_address('127.0.0.1:1234') == ('127.0.0.1', 1234)
+
+def test_create_executor(distributed_config, py_file):
+    assert type(create_executor(distributed_config, py_file)) is Executor
+
+    distributed_config._dict.auto_config.executor.workers = ['127.0.0.1:1']
+    assert type(create_executor(distributed_config, py_file)) is RemoteExecutor
+
+def test_job_executor_shares_executor_setup(distributed_config, tmpdir):
+    # the run_path only has to exist when the job runs, not when it is received
+    job = {'run_path': str(pathlib.Path(tmpdir) / 'not_here_yet.py'), 'max_runtime_seconds': 5}
+    executor = _JobExecutor(distributed_config, job, MagicMock())
+
+    assert executor.run_path == pathlib.Path(job['run_path'])
+    assert executor.circuit_breaker is distributed_config.get_circuit_breaker()
+    assert executor.tracer is distributed_config.get_tracer()
+    assert executor.get_process_max_runtime_seconds() == 5
+
+def test_worker_requires_authkey(distributed_config):
+    distributed_config._dict.auto_config.executor.worker_authkey = None
+    with pytest.raises(ConfigKeyMissingError):
+        Worker(distributed_config, ('127.0.0.1', 0))
+
+def test_remote_executor_requires_authkey(distributed_config, py_file):
+    distributed_config._dict.auto_config.executor.workers = ['127.0.0.1:1']
+    distributed_config._dict.auto_config.executor.worker_authkey = None
+    with pytest.raises(ConfigKeyMissingError):
+        create_executor(distributed_config, py_file)
+
+def _make_script(tmpdir, name, text):
+    script = pathlib.Path(tmpdir) / name
+    script.write_text(text)
+    return script.resolve()
+
+def test_remote_execution_across_workers(distributed_config, worker_processes, tmpdir):
+    script = _make_script(tmpdir, 'exit_3.py', 'print("hi");import sys;sys.exit(3)')
+    executor = RemoteExecutor(distributed_config, script)
+    log_lines = _capture_output(executor)
+
+    # more jobs than workers, so every worker gets used
+    for _ in range(len(worker_processes) * 2):
+        assert executor.execute() == 3
+
+    assert log_lines.count(f'{PROCESS_LOG_LINE_PREFIX}hi') == len(worker_processes) * 2
+    for worker in distributed_config.get_executor_config().workers:
+        assert any(worker in line for line in log_lines)
+
+def test_remote_execution_resolves_command_on_worker(distributed_config, worker_processes, py_file):
+    executor = RemoteExecutor(distributed_config, py_file)
+    log_lines = _capture_output(executor)
+
+    # the coordinator's interpreter isn't used, the worker uses its own
+    with patch.object(auto.executor.sys, 'executable', 'not_a_real_python'):
+        assert executor.execute() == 0
+
+    assert f'{PROCESS_LOG_LINE_PREFIX}hello' in log_lines
+
+def test_remote_execution_retries(distributed_config, worker_processes, tmpdir):
+    distributed_config._dict.auto_config.executor.retry_count = 2
+    script = _make_script(tmpdir, 'fail.py', 'print("try");import sys;sys.exit(1)')
+    executor = RemoteExecutor(distributed_config, script)
+    executor.get_retry_backoff_seconds = MagicMock(return_value=0)
+    log_lines = _capture_output(executor)
+
+    assert executor.execute() == 1
+    assert log_lines.count(f'{PROCESS_LOG_LINE_PREFIX}try') == 3
+
+def test_remote_execution_death_time(distributed_config, worker_processes, tmpdir):
+    script = _make_script(tmpdir, 'sleep.py', 'import time;time.sleep(5)')
+    executor = RemoteExecutor(distributed_config, script)
+    executor.get_process_max_runtime_seconds = MagicMock(return_value=0)
+    _capture_output(executor)
+
+    assert executor.execute() != 0
+
+def test_remote_execution_worker_error(distributed_config, worker_processes, tmpdir):
+    # no shebang to parse on the worker since the file is gone
+    script = _make_script(tmpdir, 'gone.sh', 'echo hi')
+    executor = RemoteExecutor(distributed_config, script)
+    script.unlink()
+    log_lines = _capture_output(executor)
+
+    assert executor.execute() == WORKER_FAILURE_EXIT_CODE
+    assert any('failed to run' in line for line in log_lines)
+
+def test_remote_execution_falls_back_to_local(distributed_config, tmpdir):
+    distributed_config._dict.auto_config.executor.workers = ['127.0.0.1:1']
+    script = _make_script(tmpdir, 'local.py', 'print("local")')
+    executor = RemoteExecutor(distributed_config, script)
+    log_lines = _capture_output(executor)
+
+    assert executor.execute() == 0
+    assert 'No worker could be reached, executing locally.' in log_lines
+    assert f'{PROCESS_LOG_LINE_PREFIX}local' in log_lines
+
+def test_worker_in_thread(distributed_config, py_file):
+    worker = Worker(distributed_config, ('127.0.0.1', 0))
+    thread = threading.Thread(target=worker.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = worker.address
+    distributed_config._dict.auto_config.executor.workers = [f'{host}:{port}']
+    executor = create_executor(distributed_config, py_file)
+    log_lines = _capture_output(executor)
+
+    try:
+        assert executor.execute() == 0
+        assert f'{PROCESS_LOG_LINE_PREFIX}hello' in log_lines
+    finally:
+        worker.close()
+
+@pytest.fixture(scope='function')
+def thread_workers(distributed_config):
+    workers = []
+
+    def start(count):
+        for _ in range(count):
+            worker = Worker(distributed_config, ('127.0.0.1', 0))
+            threading.Thread(target=worker.serve_forever, daemon=True).start()
+            workers.append(worker)
+        distributed_config._dict.auto_config.executor.workers = [f'{host}:{port}' for host, port in (w.address for w in workers)]
+        return workers
+
+    yield start
+
+    for worker in workers:
+        worker.close()
+
+def test_remote_execution_skips_busy_workers(distributed_config, thread_workers, tmpdir):
+    thread_workers(2)
+    slow = RemoteExecutor(distributed_config, _make_script(tmpdir, 'slow.py', 'import time;time.sleep(3)'))
+    fast = RemoteExecutor(distributed_config, _make_script(tmpdir, 'fast.py', 'print("fast")'))
+    _capture_output(slow)
+    log_lines = _capture_output(fast)
+
+    slow_thread = threading.Thread(target=slow.execute)
+    slow_thread.start()
+    time.sleep(.5)
+
+    start = time.time()
+    assert fast.execute() == 0
+    assert time.time() - start < 2
+    assert f'{PROCESS_LOG_LINE_PREFIX}fast' in log_lines
+
+    slow_thread.join()
+
+def test_remote_execution_waits_when_all_workers_are_busy(distributed_config, thread_workers, tmpdir):
+    thread_workers(1)
+    slow = RemoteExecutor(distributed_config, _make_script(tmpdir, 'slow.py', 'import time;time.sleep(1)'))
+    fast = RemoteExecutor(distributed_config, _make_script(tmpdir, 'fast.py', 'print("fast")'))
+    _capture_output(slow)
+    log_lines = _capture_output(fast)
+
+    slow_thread = threading.Thread(target=slow.execute)
+    slow_thread.start()
+    time.sleep(.3)
+
+    assert fast.execute() == 0
+    assert 'No worker could be reached, executing locally.' not in log_lines
+    assert any('is busy' in line for line in log_lines)
+
+    slow_thread.join()
+
+def _hung_worker(listener, accepted):
+    ''' Accepts a job, says it accepted it, then never answers again '''
+    connection = listener.accept()
+    connection.recv_bytes()
+    if accepted:
+        connection.send_bytes(b'{"accepted": true}')
+    time.sleep(10)
+
+@pytest.mark.parametrize('accepted', [True, False])
+def test_remote_execution_hung_worker_times_out_and_retries(distributed_config, tmpdir, accepted):
+    listener = multiprocessing.connection.Listener(('127.0.0.1', 0), authkey=b'secret')
+    threading.Thread(target=_hung_worker, args=(listener, accepted), daemon=True).start()
+    host, port = listener.address
+
+    exec_config = distributed_config._dict.auto_config.executor
+    exec_config.workers = [f'{host}:{port}']
+    exec_config.max_process_runtime_seconds = 0
+    exec_config.retry_count = 1
+
+    executor = RemoteExecutor(distributed_config, _make_script(tmpdir, 'hang.py', 'print("hi")'))
+    executor.get_retry_backoff_seconds = MagicMock(return_value=0)
+    log_lines = _capture_output(executor)
+
+    try:
+        with patch.object(auto.distributed, '_WORKER_GRACE_SECONDS', .5):
+            start = time.time()
+            # the hung worker fails the first attempt, the retry can't reach it so it runs locally
+            assert executor.execute() == 0
+            assert time.time() - start < 5
+    finally:
+        listener.close()
+
+    assert any('Lost connection to worker' in line for line in log_lines)
+    assert f'.. Exit Code: {WORKER_FAILURE_EXIT_CODE}' in log_lines
+    assert f'{PROCESS_LOG_LINE_PREFIX}hi' in log_lines
@@ -12,8 +12,10 @@ import tempenv
 import time
 import threading
 import typing
+import uuid
 
 from auto.config import AutoConfig
+from auto.retry import CircuitOpenError, get_backoff_seconds
 
 PROCESS_LOG_LINE_PREFIX = '>> '
 
@@ -31,15 +33,27 @@ class Executor:
         either an executable, script, or something similar.
         '''
         self.config = config
-        self.run_path = run_path
         self.logger = config.get_component_logger('executor')
+        self.tracer = config.get_tracer()
+        self.circuit_breaker = config.get_circuit_breaker()
+        self.structured_logging = config.get_executor_config().get('log_structured', False)
 
-        if not self.run_path.is_file():
-            which_path = shutil.which(str(self.run_path))
-            if not which_path:
-                raise FileNotFoundError(f'{self.run_path} does not exist (and is not in PATH: {os.environ["PATH"]})')
-            else:
-                self.run_path = pathlib.Path(which_path)
+        # set for each run in run_subprocess_output_to_logger
+        self.run_id = None
+        self.pid = None
+
+        self.run_path = self._resolve_run_path(run_path)
+
+    def _resolve_run_path(self, run_path: pathlib.Path) -> pathlib.Path:
+        ''' Returns the run_path if it is a file, otherwise looks for it in PATH '''
+        if run_path.is_file():
+            return run_path
+
+        with self.tracer.span('executor.init.which'):
+            which_path = shutil.which(str(run_path))
+        if not which_path:
+            raise FileNotFoundError(f'{run_path} does not exist (and is not in PATH: {os.environ["PATH"]})')
+        return pathlib.Path(which_path)
 
     def get_process_max_runtime_seconds(self) -> int:
         ''' Gets the max runtime in seconds for an execution '''
@@ -49,6 +63,21 @@ class Executor:
             secs = 31556952
         return secs
 
+    def get_retry_count(self) -> int:
+        ''' Gets the number of times to retry a failed execution '''
+        return self.config.get_executor_config().get('retry_count', None) or 0
+
+    def get_retry_backoff_seconds(self, attempt: int) -> float:
+        ''' Gets the (jittered) number of seconds to wait before the given retry attempt (starting at 0) '''
+        executor_config = self.config.get_executor_config()
+        base = executor_config.get('retry_backoff_seconds', None)
+        if base is None:
+            base = 1
+        maximum = executor_config.get('retry_backoff_max_seconds', None)
+        if maximum is None:
+            maximum = 60
+        return get_backoff_seconds(attempt, base, maximum)
+
     def get_execution_directory(self) -> typing.Optional[pathlib.Path]:
         ''' Gets the execution directory from the config. If there is a path given, ensure it exists '''
         p = self.config.get_executor_config().execution_directory or None
@@ -60,21 +89,46 @@ class Executor:
 
     def get_pathext(self) -> typing.List[str]:
         ''' Gets a list of extensions that 'we can run directly via the shell' '''
-        pathext = os.environ['PATHEXT'].lower().split(os.pathsep)
+        pathext = os.environ.get('PATHEXT', '').lower().split(os.pathsep)
         ext_to_remove = [a.lower() for a in self.config.get_executor_config().get('extensions_to_remove_from_pathext', [])]
         return [p for p in pathext if p not in ext_to_remove]
 
+    def _handle_output_line(self, line: str, offset: typing.Optional[int]=None):
+        '''
+        Called with each line of process output (without the line ending) and the
+        byte offset of the line within the output stream.
+        '''
+        if self.structured_logging:
+            # tag the record instead of prefixing the message
+            self.logger.info(line, extra={'run_id': self.run_id, 'pid': self.pid, 'path': str(self.run_path), 'offset': offset})
+        else:
+            self.logger.info(f"{PROCESS_LOG_LINE_PREFIX}{line}")
+
     def _log_process_stdout(self, process: subprocess.Popen):
-        ''' Should be run in a thread to continually read output and send it to a logger. '''
-        for stdout_line in process.stdout:
-            stdout_line = stdout_line.decode().rstrip('\n').rstrip('\r')
-            self.logger.info(f"{PROCESS_LOG_LINE_PREFIX}{stdout_line}")
+        '''
+        Should be run in a thread to continually read output and send it to a logger.
+
+        The time spent handling lines (not waiting on the process for them) is summed up
+        and recorded as the executor.run.log_output span.
+        '''
+        offset = 0
+        handling = 0
+        start = time.perf_counter()
+        for raw_line in process.stdout:
+            line_start = time.perf_counter()
+            stdout_line = raw_line.decode().rstrip('\n').rstrip('\r')
+            self._handle_output_line(stdout_line, offset)
+            offset += len(raw_line)
+            handling += time.perf_counter() - line_start
+        self.tracer.record('executor.run.log_output', start, time.perf_counter(), handling)
 
     def run_subprocess_output_to_logger(self, cmd: typing.Union[str, list]) -> int:
         '''
         Runs the given command using subprocess, along with options in the AutoConfig.
         Output will be logged to the logger.
         '''
+        self.run_id = uuid.uuid4().hex
+        self.pid = None
         self.logger.info(f"Executing: {cmd}...")
 
         max_runtime = self.get_process_max_runtime_seconds()
@@ -82,7 +136,12 @@ class Executor:
         death_time = max_runtime + time.time()
         self.logger.debug(f".. Process death time is: {datetime.datetime.fromtimestamp(death_time)}")
 
-        process = subprocess.Popen(cmd, stderr=subprocess.STDOUT, stdout=subprocess.PIPE, cwd=self.get_execution_directory())
+        with self.tracer.span('executor.run.execution_directory'):
+            cwd = self.get_execution_directory()
+
+        with self.tracer.span('executor.run.spawn'):
+            process = subprocess.Popen(cmd, stderr=subprocess.STDOUT, stdout=subprocess.PIPE, cwd=cwd)
+        self.pid = process.pid
         self.logger.debug(f"Process pid: {process.pid}")
 
         # start a temp thread to keep track read the command output and
@@ -91,46 +150,95 @@ class Executor:
         log_thread.start()
 
         # While waiting for the process to end, check for death time.
-        # If death time passes, kill the process
-        while process.poll() is None:
-            if time.time() > death_time:
-                self.logger.info("Killing process as death time has elapsed.")
-                process.kill()
-                process.terminate()
+        # If death time passes, kill the process.
+        # (This span is the process's runtime, the logging overhead is in executor.run.log_output)
+        with self.tracer.span('executor.run.wait'):
+            while process.poll() is None:
+                if time.time() > death_time:
+                    self.logger.info("Killing process as death time has elapsed.")
+                    process.kill()
+                    process.terminate()
 
-            # yield a bit
-            time.sleep(.001)
+                # yield a bit
+                time.sleep(.001)
 
-        # once we get here the process should no longer be running
-        exit_code = process.wait()
-        log_thread.join()
+            # once we get here the process should no longer be running
+            exit_code = process.wait()
+
+        with self.tracer.span('executor.run.log_join'):
+            log_thread.join()
 
         self.logger.info(f".. Exit Code: {exit_code}")
+
+        # write out anything that is still batched up
+        for handler in self.logger.handlers:
+            handler.flush()
+
         return exit_code
 
-    def execute(self) -> int:
+    def get_command(self, pathext: typing.List[str]) -> typing.List[str]:
         '''
-        Executes this Executor.
-
-        Will attempt to figure out the best way to do that then ultimately
-        perform a subprocess execution and waiting for it to complete
+        Figures out the best way to execute the run_path and returns the
+        command (as a list) to do so.
         '''
         extension = self.run_path.suffix.lstrip('.').lower()
-        pathext = self.get_pathext()
-        with tempenv.TemporaryEnvironment({'PATHEXT' : os.pathsep.join(pathext)}):
-            if f'.{extension}' in pathext:
-                # should be able to run directly from command line
-                self.logger.debug("About to do a PATHEX-based execution")
-                cmd = [str(self.run_path)]
-            elif extension in ('py', 'pyc'):
-                # Run a python script with the running python
-                self.logger.debug("About to do a Python-based execution")
-                cmd = [sys.executable, str(self.run_path)]
-            else:
-                # Attempt to read/use the shebang line
-                self.logger.debug("About to do a Shebang-based execution")
+        if f'.{extension}' in pathext:
+            # should be able to run directly from command line
+            self.logger.debug("About to do a PATHEX-based execution")
+            return [str(self.run_path)]
+        elif extension in ('py', 'pyc'):
+            # Run a python script with the running python
+            self.logger.debug("About to do a Python-based execution")
+            return [sys.executable, str(self.run_path)]
+        else:
+            # Attempt to read/use the shebang line
+            self.logger.debug("About to do a Shebang-based execution")
+            with self.tracer.span('executor.execute.shebang'):
                 with open(self.run_path, 'r') as file:
                     shebang = parseshebang.parse(file)
-                cmd = shebang + [str(self.run_path)]
+            return shebang + [str(self.run_path)]
 
-            return self.run_subprocess_output_to_logger(cmd)
+    def _execute_once(self, pathext: typing.List[str]) -> int:
+        ''' Resolves the command for the run_path and runs it once '''
+        return self.run_subprocess_output_to_logger(self.get_command(pathext))
+
+    def execute(self) -> int:
+        '''
+        Executes this Executor.
+
+        Will attempt to figure out the best way to do that then ultimately
+        perform a subprocess execution and waiting for it to complete.
+
+        A failed execution is retried (with backoff) up to the configured retry count.
+        If the circuit for this run_path is open, a CircuitOpenError is raised instead.
+        '''
+        path = str(self.run_path)
+        if not self.circuit_breaker.allow(path):
+            self.logger.info(f"Not executing {path} as its circuit is open.")
+            raise CircuitOpenError(f'{path} has failed too often and is being suppressed')
+
+        try:
+            with self.tracer.run(str(self.run_path)):
+                with self.tracer.span('executor.execute.pathext'):
+                    pathext = self.get_pathext()
+
+                with tempenv.TemporaryEnvironment({'PATHEXT' : os.pathsep.join(pathext)}):
+                    exit_code = self._execute_once(pathext)
+
+                    retry_count = self.get_retry_count()
+                    for attempt in range(retry_count):
+                        if exit_code == 0:
+                            break
+
+                        backoff = self.get_retry_backoff_seconds(attempt)
+                        self.logger.info(f"Retrying ({attempt + 1}/{retry_count}) in {backoff:.2f} seconds.")
+                        with self.tracer.span('executor.execute.backoff'):
+                            time.sleep(backoff)
+                        exit_code = self._execute_once(pathext)
+        except BaseException:
+            # always record an outcome so a half-open circuit doesn't wait on this trial forever
+            self.circuit_breaker.record(path, False)
+            raise
+
+        self.circuit_breaker.record(path, exit_code == 0)
+        return exit_code
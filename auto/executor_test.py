@@ -1,4 +1,5 @@
 import auto.executor
+import auto.retry
 import io
 import os
 import pathlib
@@ -6,11 +7,15 @@ import pytest
 import stat
 import sys
 import tempenv
+import time
 import uuid
 
+from auto.config import AutoConfig
 from auto.executor import Executor, PROCESS_LOG_LINE_PREFIX
+from auto.retry import CircuitOpenError
+from auto.tracing import Tracer
 from .config_test import valid_auto_config
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
 @pytest.fixture(scope='function')
 def py_file(tmpdir):
@@ -54,11 +59,30 @@ def test_init_run_path_allows_something_in_path(executor):
     executor.config.get_component_logger.assert_called_once_with('executor')
     assert executor.run_path == executor.run_path.resolve()
 
+def test_init_unverified_config_without_tracing(py_file):
+    config = AutoConfig({'auto_config': {'executor': {'log_directory': None, 'log_level': None, 'log_format': None}}}, verify=False)
+    executor = Executor(config, py_file)
+    assert not executor.tracer.enable
+
 def test_get_process_max_runtime_seconds(executor):
     assert executor.get_process_max_runtime_seconds() == 5
     executor.config._dict.auto_config.executor.max_process_runtime_seconds = None
     assert executor.get_process_max_runtime_seconds() == 31556952
 
+def test_get_retry_count(executor):
+    assert executor.get_retry_count() == 0
+    executor.config._dict.auto_config.executor.retry_count = 3
+    assert executor.get_retry_count() == 3
+
+def test_get_retry_backoff_seconds(executor):
+    for attempt in range(10):
+        assert 0 <= executor.get_retry_backoff_seconds(attempt) <= 60
+
+    executor.config._dict.auto_config.executor.retry_backoff_seconds = 2
+    executor.config._dict.auto_config.executor.retry_backoff_max_seconds = 5
+    with patch.object(auto.retry.random, 'uniform', side_effect=lambda a, b: b):
+        assert [executor.get_retry_backoff_seconds(a) for a in range(4)] == [2, 4, 5, 5]
+
 def test_get_execution_directory(executor, tmpdir):
     tmp = pathlib.Path(tmpdir) / 'bleh'
     assert not tmp.is_dir()
@@ -98,6 +122,37 @@ I am
         f'{PROCESS_LOG_LINE_PREFIX}    cool! '
     ]
 
+def test_log_process_stdout_structured(executor):
+    executor.structured_logging = True
+    executor.run_id = 'abc'
+    executor.pid = 5
+    executor.logger = MagicMock()
+
+    process = MagicMock()
+    process.stdout = io.BytesIO(b'Hello\r\nworld\n')
+
+    executor._log_process_stdout(process)
+
+    assert executor.logger.info.call_args_list == [
+        call('Hello', extra={'run_id': 'abc', 'pid': 5, 'path': str(executor.run_path), 'offset': 0}),
+        call('world', extra={'run_id': 'abc', 'pid': 5, 'path': str(executor.run_path), 'offset': 7}),
+    ]
+
+def test_log_process_stdout_records_handling_time(executor):
+    executor.tracer = Tracer(enable=True)
+    executor.logger = MagicMock()
+    executor._handle_output_line = MagicMock(side_effect=lambda *args: time.sleep(.01))
+
+    process = MagicMock()
+    process.stdout = io.BytesIO(b'a\nb\n')
+
+    executor._log_process_stdout(process)
+
+    span = executor.tracer.recent_spans[-1]
+    assert span.name == 'executor.run.log_output'
+    assert span.duration >= .02
+    assert span.duration <= span.end - span.start
+
 def test_run_subprocess_output_to_logger_death_time(executor):
     executor.get_process_max_runtime_seconds = MagicMock(return_value=0)
 
@@ -125,6 +180,14 @@ def test_run_subprocess_output_to_logger_normal(executor):
 
     assert f'{PROCESS_LOG_LINE_PREFIX}0,1,2,3,4'
 
+def test_run_subprocess_output_to_logger_sets_run_id_and_pid(executor):
+    executor.logger = MagicMock()
+    assert executor.run_id is None
+
+    assert executor.run_subprocess_output_to_logger([sys.executable, '-c', 'pass']) == 0
+    assert len(executor.run_id) == 32
+    assert isinstance(executor.pid, int)
+
 def test_execute_in_pathext(executor):
     executor.run_path = pathlib.Path('bleh.exe')
     executor.get_pathext = MagicMock(return_value=['.exe'])
@@ -171,3 +234,62 @@ def test_execute_in_shebang(executor):
 
     assert 'Shebang' in log_lines[-1]
     executor.run_subprocess_output_to_logger.assert_called_once_with(['lolshebang', str(executor.run_path)])
+
+def test_execute_records_spans(executor):
+    executor.config._dict.auto_config.tracing.enable = True
+    executor.config._tracer = None
+    executor.__init__(executor.config, executor.run_path)
+
+    with tempenv.TemporaryEnvironment({'PATHEXT': ''}):
+        assert executor.execute() == 0
+
+    names = [s.name for s in executor.tracer.recent_spans]
+    for name in ('executor.execute.pathext', 'executor.run.execution_directory', 'executor.run.spawn',
+                 'executor.run.wait', 'executor.run.log_output', 'executor.run.log_join', str(executor.run_path)):
+        assert name in names
+    assert names[-1] == str(executor.run_path)
+
+def test_execute_retries_until_success(executor):
+    executor.config._dict.auto_config.executor.retry_count = 3
+    executor.get_pathext = MagicMock(return_value=[])
+    executor.get_retry_backoff_seconds = MagicMock(return_value=0)
+    executor.run_subprocess_output_to_logger = MagicMock(side_effect=[1, 2, 0])
+
+    assert executor.execute() == 0
+    assert executor.run_subprocess_output_to_logger.call_count == 3
+    assert [c.args for c in executor.get_retry_backoff_seconds.call_args_list] == [(0,), (1,)]
+
+def test_execute_retries_exhausted(executor):
+    executor.config._dict.auto_config.executor.retry_count = 2
+    executor.get_pathext = MagicMock(return_value=[])
+    executor.get_retry_backoff_seconds = MagicMock(return_value=0)
+    executor.run_subprocess_output_to_logger = MagicMock(return_value=1)
+
+    assert executor.execute() == 1
+    assert executor.run_subprocess_output_to_logger.call_count == 3
+
+def test_execute_circuit_breaker_opens(executor):
+    executor.config._dict.auto_config.executor.circuit_breaker_failure_rate = 1
+    executor.config._dict.auto_config.executor.circuit_breaker_window = 2
+    executor.config._circuit_breaker = None
+    executor.__init__(executor.config, executor.run_path)
+    executor.get_pathext = MagicMock(return_value=[])
+    executor.run_subprocess_output_to_logger = MagicMock(return_value=1)
+
+    assert executor.execute() == 1
+    assert executor.execute() == 1
+    with pytest.raises(CircuitOpenError):
+        executor.execute()
+
+    assert executor.run_subprocess_output_to_logger.call_count == 2
+    assert executor.config.get_circuit_breaker().get_suppressed_paths() == [str(executor.run_path)]
+
+def test_execute_records_failure_on_exception(executor):
+    executor.circuit_breaker = MagicMock()
+    executor.get_pathext = MagicMock(return_value=[])
+    executor.run_subprocess_output_to_logger = MagicMock(side_effect=OSError())
+
+    with pytest.raises(OSError):
+        executor.execute()
+
+    executor.circuit_breaker.record.assert_called_once_with(str(executor.run_path), False)
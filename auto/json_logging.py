@@ -0,0 +1,115 @@
+'''
+Home to the structured (JSON lines) log output for Auto
+'''
+import json
+import logging
+import logging.handlers
+import threading
+import typing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Attributes that may be attached to a record (via extra=) and are copied into the JSON line if present.
+RECORD_FIELDS = ('run_id', 'pid', 'path', 'offset')
+
+def dumps(obj: dict) -> str:
+    ''' Serializes the given dict to a compact JSON string, using orjson if it is installed '''
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=str)
+
+class JsonLinesFormatter(logging.Formatter):
+    '''
+    Formats each record as a single compact JSON object (one per line).
+
+    Always includes the timestamp (seconds since the epoch), level, logger name and message.
+    The fields in RECORD_FIELDS are included when they were passed with extra=.
+    '''
+    def format(self, record: logging.LogRecord) -> str:
+        ''' Formats the record as a JSON line '''
+        data = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+
+        return dumps(data)
+
+class BatchingHandler(logging.handlers.MemoryHandler):
+    '''
+    Buffers records and writes each batch to the target StreamHandler (or a subclass
+    like RotatingFileHandler) with a single write() and flush().
+
+    A batch is written once it holds capacity records, a record at flushLevel or above arrives,
+    or max_latency_seconds have passed since the first record of the batch was buffered.
+    '''
+    def __init__(self, capacity: int, target: logging.StreamHandler, flushLevel: int=logging.ERROR,
+                 max_latency_seconds: typing.Optional[float]=1):
+        '''
+        Initializer. The target's formatter is used to format each record.
+        If max_latency_seconds is None, batches are only written when full (or on flushLevel).
+        '''
+        logging.handlers.MemoryHandler.__init__(self, capacity, flushLevel=flushLevel, target=target)
+        self.max_latency_seconds = max_latency_seconds
+        self._timer = None
+
+    def emit(self, record: logging.LogRecord):
+        ''' Buffers the record, writing the batch if needed '''
+        self.buffer.append(record)
+        if self.shouldFlush(record):
+            self.flush()
+        elif self._timer is None and self.max_latency_seconds is not None:
+            # first record of the batch: make sure it goes out within max_latency_seconds
+            self._timer = threading.Timer(self.max_latency_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        ''' Writes out all buffered records as one batch '''
+        self.acquire()
+        try:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if self.target and self.buffer:
+                self._write_batch(self.buffer)
+                self.buffer.clear()
+        finally:
+            self.release()
+
+    def _write_batch(self, records: list):
+        ''' Formats the records and writes them to the target's stream in one go '''
+        target = self.target
+        target.acquire()
+        try:
+            text = ''.join(target.format(record) + target.terminator for record in records)
+
+            if isinstance(target, logging.FileHandler) and target.stream is None:
+                target.stream = target._open()
+
+            # check for rollover once per batch rather than once per record
+            if isinstance(target, logging.handlers.RotatingFileHandler) and target.maxBytes > 0:
+                target.stream.seek(0, 2)
+                position = target.stream.tell()
+                if position > 0 and position + len(text) >= target.maxBytes:
+                    target.doRollover()
+
+            target.stream.write(text)
+            target.stream.flush()
+        except Exception:
+            target.handleError(records[-1])
+        finally:
+            target.release()
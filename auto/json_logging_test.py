@@ -0,0 +1,114 @@
+import auto.json_logging
+import json
+import logging
+import logging.handlers
+import pathlib
+import sys
+import time
+
+from auto.json_logging import BatchingHandler, JsonLinesFormatter, dumps
+from unittest.mock import MagicMock, patch
+
+def _make_record(msg='hello', **extra):
+    record = logging.LogRecord('auto.executor', logging.INFO, __file__, 1, msg, None, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_dumps_is_compact():
+    assert dumps({'a': 1, 'b': 'c'}) == '{"a":1,"b":"c"}'
+
+def test_dumps_without_orjson():
+    with patch.object(auto.json_logging, 'orjson', None):
+        assert dumps({'a': [1, 2], 'b': 'é'}) == '{"a":[1,2],"b":"é"}'
+
+def test_json_lines_formatter():
+    record = _make_record(run_id='abc', pid=5, path='/x.py', offset=10)
+    line = JsonLinesFormatter().format(record)
+    assert '\n' not in line
+    assert json.loads(line) == {
+        'time': record.created,
+        'level': 'INFO',
+        'logger': 'auto.executor',
+        'message': 'hello',
+        'run_id': 'abc',
+        'pid': 5,
+        'path': '/x.py',
+        'offset': 10,
+    }
+
+def test_json_lines_formatter_skips_missing_fields():
+    data = json.loads(JsonLinesFormatter().format(_make_record('a\nb', pid=None)))
+    assert data['message'] == 'a\nb'
+    assert 'pid' not in data
+    assert 'run_id' not in data
+
+def test_json_lines_formatter_exception():
+    try:
+        raise ValueError('oops')
+    except ValueError:
+        record = logging.LogRecord('auto.executor', logging.ERROR, __file__, 1, 'failed', None, sys.exc_info())
+
+    data = json.loads(JsonLinesFormatter().format(record))
+    assert 'ValueError: oops' in data['exception']
+
+def test_batching_handler_writes_once_per_batch():
+    stream = MagicMock()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(logging.Formatter('%(message)s'))
+    handler = BatchingHandler(3, target)
+
+    handler.handle(_make_record('a'))
+    handler.handle(_make_record('b'))
+    stream.write.assert_not_called()
+
+    handler.handle(_make_record('c'))
+    stream.write.assert_called_once_with('a\nb\nc\n')
+    stream.flush.assert_called_once_with()
+    assert handler.buffer == []
+
+def test_batching_handler_max_latency():
+    stream = MagicMock()
+    handler = BatchingHandler(100, logging.StreamHandler(stream), max_latency_seconds=.01)
+
+    handler.handle(_make_record('a'))
+    handler.handle(_make_record('b'))
+
+    deadline = time.time() + 5
+    while not stream.write.called and time.time() < deadline:
+        time.sleep(.01)
+
+    stream.write.assert_called_once_with('a\nb\n')
+    assert handler._timer is None
+
+def test_batching_handler_without_max_latency():
+    stream = MagicMock()
+    handler = BatchingHandler(100, logging.StreamHandler(stream), max_latency_seconds=None)
+
+    handler.handle(_make_record('a'))
+    assert handler._timer is None
+    stream.write.assert_not_called()
+
+def test_batching_handler_flushes_on_error():
+    stream = MagicMock()
+    handler = BatchingHandler(100, logging.StreamHandler(stream))
+
+    handler.handle(_make_record('a'))
+    record = _make_record('b')
+    record.levelno = logging.ERROR
+    handler.handle(record)
+    stream.write.assert_called_once_with('a\nb\n')
+
+def test_batching_handler_rotating_file(tmpdir):
+    log_file = pathlib.Path(tmpdir) / 'log.txt'
+    target = logging.handlers.RotatingFileHandler(log_file, maxBytes=10, backupCount=2)
+    target.setFormatter(logging.Formatter('%(message)s'))
+    handler = BatchingHandler(2, target)
+
+    for msg in ('aaa', 'bbb', 'ccc', 'ddd'):
+        handler.handle(_make_record(msg))
+    handler.close()
+    target.close()
+
+    # the second batch didn't fit so the file rolled over once, between batches
+    assert (pathlib.Path(tmpdir) / 'log.txt.1').read_text() == 'aaa\nbbb\n'
+    assert log_file.read_text() == 'ccc\nddd\n'
@@ -0,0 +1,138 @@
+'''
+Home to retry backoff and the circuit breaker used by the Executor
+'''
+import collections
+import random
+import threading
+import time
+import typing
+
+class CircuitOpenError(RuntimeError):
+    ''' Raised when an execution is suppressed because its circuit is open '''
+    pass
+
+def get_backoff_seconds(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    '''
+    Gets the number of seconds to wait before the given retry attempt (starting at 0).
+
+    Uses exponential backoff with full jitter: a random time between 0 and
+    min(max_seconds, base_seconds * 2 ** attempt).
+    '''
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+class CircuitBreaker:
+    '''
+    A per-path circuit breaker.
+
+    The outcomes of the last window executions of each path are tracked. Once the window
+    is full and the failure rate reaches failure_rate, the circuit for that path opens and
+    executions are suppressed for reset_seconds. After that a single trial execution is
+    allowed: success closes the circuit, failure opens it again.
+    '''
+    def __init__(self, failure_rate: typing.Optional[float]=None, window: int=5, reset_seconds: float=300):
+        '''
+        Initializer. If failure_rate is None, the breaker is disabled and never opens.
+        Otherwise failure_rate must be in (0, 1] and window must be at least 1.
+        '''
+        if failure_rate is not None and not 0 < failure_rate <= 1:
+            raise ValueError(f'failure_rate must be greater than 0 and at most 1, not {failure_rate}')
+        if window < 1:
+            raise ValueError(f'window must be at least 1, not {window}')
+
+        self.failure_rate = failure_rate
+        self.window = window
+        self.reset_seconds = reset_seconds
+
+        self._lock = threading.Lock()
+        self._outcomes = {}
+        self._opened_at = {}
+        self._trials = set()
+
+    @classmethod
+    def from_config(cls, executor_config: dict) -> 'CircuitBreaker':
+        ''' Creates a CircuitBreaker from the executor section of an AutoConfig '''
+        window = executor_config.get('circuit_breaker_window', None)
+        reset_seconds = executor_config.get('circuit_breaker_reset_seconds', None)
+        return cls(
+            failure_rate=executor_config.get('circuit_breaker_failure_rate', None),
+            window=window if window is not None else 5,
+            reset_seconds=reset_seconds if reset_seconds is not None else 300,
+        )
+
+    @property
+    def enable(self) -> bool:
+        ''' True if this breaker can open '''
+        return self.failure_rate is not None
+
+    def allow(self, path: str) -> bool:
+        '''
+        Returns True if the given path may be executed right now.
+
+        When half-open, only the first caller is allowed through (as the trial execution)
+        until its outcome is passed to record().
+        '''
+        if not self.enable:
+            return True
+
+        with self._lock:
+            opened_at = self._opened_at.get(path)
+            if opened_at is None:
+                return True
+
+            # half-open: let a single trial execution through once reset_seconds have passed
+            if path in self._trials or time.monotonic() - opened_at < self.reset_seconds:
+                return False
+
+            self._trials.add(path)
+            return True
+
+    def record(self, path: str, success: bool):
+        ''' Records the outcome of an execution of the given path '''
+        if not self.enable:
+            return
+
+        with self._lock:
+            if path in self._opened_at:
+                # this was the trial execution
+                self._trials.discard(path)
+                if success:
+                    del self._opened_at[path]
+                    self._outcomes.pop(path, None)
+                else:
+                    self._opened_at[path] = time.monotonic()
+                return
+
+            outcomes = self._outcomes.setdefault(path, collections.deque(maxlen=self.window))
+            outcomes.append(success)
+            if len(outcomes) == self.window and outcomes.count(False) / self.window >= self.failure_rate:
+                self._opened_at[path] = time.monotonic()
+
+    def get_state(self) -> typing.Dict[str, dict]:
+        '''
+        Returns the state of every tracked path as a dict of path to:
+            {'state': 'closed'|'open'|'half-open', 'failures': int, 'executions': int, 'seconds_until_retry': float}
+        '''
+        state = {}
+        with self._lock:
+            now = time.monotonic()
+            for path in set(self._outcomes) | set(self._opened_at):
+                outcomes = self._outcomes.get(path, ())
+                opened_at = self._opened_at.get(path)
+                if opened_at is None:
+                    circuit_state = 'closed'
+                    seconds_until_retry = 0
+                else:
+                    seconds_until_retry = max(0, self.reset_seconds - (now - opened_at))
+                    circuit_state = 'open' if seconds_until_retry else 'half-open'
+
+                state[path] = {
+                    'state': circuit_state,
+                    'failures': list(outcomes).count(False),
+                    'executions': len(outcomes),
+                    'seconds_until_retry': seconds_until_retry,
+                }
+        return state
+
+    def get_suppressed_paths(self) -> typing.List[str]:
+        ''' Returns the paths that are currently being suppressed '''
+        return sorted(path for path, info in self.get_state().items() if info['state'] == 'open')
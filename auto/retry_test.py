@@ -0,0 +1,99 @@
+import auto.retry
+import pytest
+
+from auto.retry import CircuitBreaker, get_backoff_seconds
+from unittest.mock import patch
+
+@pytest.fixture(scope='function')
+def mock_monotonic():
+    now = [1000.0]
+    with patch.object(auto.retry.time, 'monotonic', side_effect=lambda: now[0]):
+        yield now
+
+def test_get_backoff_seconds():
+    with patch.object(auto.retry.random, 'uniform', side_effect=lambda a, b: (a, b)):
+        assert get_backoff_seconds(0, 1, 10) == (0, 1)
+        assert get_backoff_seconds(3, 1, 10) == (0, 8)
+        assert get_backoff_seconds(4, 1, 10) == (0, 10)
+
+    for attempt in range(5):
+        assert 0 <= get_backoff_seconds(attempt, .5, 3) <= 3
+
+def test_circuit_breaker_disabled():
+    circuit_breaker = CircuitBreaker()
+    assert not circuit_breaker.enable
+    for _ in range(10):
+        circuit_breaker.record('a', False)
+    assert circuit_breaker.allow('a')
+    assert circuit_breaker.get_state() == {}
+
+def test_circuit_breaker_opens_on_failure_rate(mock_monotonic):
+    circuit_breaker = CircuitBreaker(failure_rate=.5, window=4, reset_seconds=10)
+
+    for success in (False, True, False):
+        circuit_breaker.record('a', success)
+        assert circuit_breaker.allow('a')
+
+    # window is now full with a 50% failure rate
+    circuit_breaker.record('a', True)
+    assert not circuit_breaker.allow('a')
+    assert circuit_breaker.get_state() == {
+        'a': {'state': 'open', 'failures': 2, 'executions': 4, 'seconds_until_retry': 10}
+    }
+    assert circuit_breaker.get_suppressed_paths() == ['a']
+
+    # other paths are not affected
+    assert circuit_breaker.allow('b')
+
+def test_circuit_breaker_half_open(mock_monotonic):
+    circuit_breaker = CircuitBreaker(failure_rate=1, window=1, reset_seconds=10)
+    circuit_breaker.record('a', False)
+    assert not circuit_breaker.allow('a')
+
+    mock_monotonic[0] += 10
+    assert circuit_breaker.allow('a')
+    assert circuit_breaker.get_state()['a']['state'] == 'half-open'
+    assert circuit_breaker.get_suppressed_paths() == []
+
+    # failed trial opens it again
+    circuit_breaker.record('a', False)
+    assert not circuit_breaker.allow('a')
+
+    # successful trial closes it
+    mock_monotonic[0] += 10
+    circuit_breaker.record('a', True)
+    assert circuit_breaker.allow('a')
+    assert 'a' not in circuit_breaker.get_state()
+
+def test_circuit_breaker_half_open_allows_a_single_trial(mock_monotonic):
+    circuit_breaker = CircuitBreaker(failure_rate=1, window=1, reset_seconds=10)
+    circuit_breaker.record('a', False)
+    mock_monotonic[0] += 10
+
+    assert circuit_breaker.allow('a')
+    # the trial is still running, so everyone else is suppressed
+    assert not circuit_breaker.allow('a')
+    assert not circuit_breaker.allow('a')
+
+    circuit_breaker.record('a', True)
+    assert circuit_breaker.allow('a')
+    assert circuit_breaker.allow('a')
+
+def test_circuit_breaker_from_config():
+    circuit_breaker = CircuitBreaker.from_config({
+        'circuit_breaker_failure_rate': .75,
+        'circuit_breaker_window': 8,
+        'circuit_breaker_reset_seconds': None,
+    })
+    assert circuit_breaker.failure_rate == .75
+    assert circuit_breaker.window == 8
+    assert circuit_breaker.reset_seconds == 300
+
+@pytest.mark.parametrize('kwargs', [
+    {'failure_rate': 0},
+    {'failure_rate': 1.5},
+    {'failure_rate': .5, 'window': 0},
+])
+def test_circuit_breaker_invalid_values(kwargs):
+    with pytest.raises(ValueError):
+        CircuitBreaker(**kwargs)
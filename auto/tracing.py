@@ -0,0 +1,153 @@
+'''
+Home to the tracing/profiling hooks for Auto
+'''
+import collections
+import contextlib
+import cProfile
+import datetime
+import pathlib
+import pstats
+import threading
+import time
+import tracemalloc
+import typing
+
+# Reused for every span when tracing is disabled so that a disabled span costs
+# a method call and nothing else.
+_NULL_CONTEXT = contextlib.nullcontext()
+
+# cProfile and tracemalloc are process-wide, so only one run (across every Tracer) can capture at a time.
+_capture_lock = threading.Lock()
+
+Span = collections.namedtuple('Span', ['name', 'start', 'end', 'duration'])
+
+class Tracer:
+    '''
+    A Tracer records named spans around the phases of a run and hands them to
+    registered callbacks.
+
+    Optionally it can also capture a cProfile profile and/or a tracemalloc
+    snapshot for each run.
+    '''
+    def __init__(self, enable: bool=False, profile: bool=False, tracemalloc: bool=False,
+                 output_directory: typing.Optional[str]=None, max_recent_spans: int=1000):
+        '''
+        Initializer. If enable is False, every span is a no-op and runs are not profiled.
+
+        If output_directory is given, profiles (.prof) and tracemalloc snapshots (.snapshot)
+        captured during runs are written there.
+        '''
+        self.enable = enable
+        self.profile = enable and profile
+        self.tracemalloc = enable and tracemalloc
+        self.output_directory = pathlib.Path(output_directory) if output_directory else None
+
+        self.recent_spans = collections.deque(maxlen=max_recent_spans)
+        self._span_callbacks = []
+        self._run_callbacks = []
+
+    @classmethod
+    def from_config(cls, tracing_config: dict) -> 'Tracer':
+        ''' Creates a Tracer from the tracing section of an AutoConfig '''
+        return cls(
+            enable=tracing_config.get('enable', False),
+            profile=tracing_config.get('profile', False),
+            tracemalloc=tracing_config.get('tracemalloc', False),
+            output_directory=tracing_config.get('output_directory', None),
+        )
+
+    def add_span_callback(self, callback: typing.Callable[[Span], None]):
+        ''' Registers a callback to be called with each finished Span '''
+        self._span_callbacks.append(callback)
+
+    def add_run_callback(self, callback: typing.Callable[[str, typing.Optional[pstats.Stats], typing.Optional[tracemalloc.Snapshot]], None]):
+        '''
+        Registers a callback to be called at the end of each run with the run name,
+        the pstats.Stats (or None if not profiling) and the tracemalloc.Snapshot (or None).
+        '''
+        self._run_callbacks.append(callback)
+
+    def record(self, name: str, start: float, end: float, duration: typing.Optional[float]=None):
+        '''
+        Records a span that has already happened. start/end are from time.perf_counter().
+
+        duration defaults to end - start. Pass it for spans that only account for part of
+        that time, like the summed time spent in a callback over the course of a run.
+        '''
+        if not self.enable:
+            return
+
+        span = Span(name, start, end, end - start if duration is None else duration)
+        self.recent_spans.append(span)
+        for callback in self._span_callbacks:
+            callback(span)
+
+    def span(self, name: str) -> typing.ContextManager:
+        ''' Returns a context manager that records a span with the given name around its body '''
+        if not self.enable:
+            return _NULL_CONTEXT
+
+        return self._span(name)
+
+    @contextlib.contextmanager
+    def _span(self, name: str):
+        ''' The real span implementation, used when tracing is enabled '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def run(self, name: str) -> typing.ContextManager:
+        '''
+        Returns a context manager that wraps a full run in a span. If profiling and/or tracemalloc
+        are enabled, they are captured for the duration of the run.
+        '''
+        if not self.enable:
+            return _NULL_CONTEXT
+
+        return self._run(name)
+
+    @contextlib.contextmanager
+    def _run(self, name: str):
+        ''' The real run implementation, used when tracing is enabled '''
+        # runs that overlap one that is already capturing just get a span
+        capture = (self.profile or self.tracemalloc) and _capture_lock.acquire(blocking=False)
+        profiler = None
+        started_tracemalloc = False
+        try:
+            if capture and self.tracemalloc and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracemalloc = True
+            if capture and self.profile:
+                profiler = cProfile.Profile()
+                profiler.enable()
+
+            with self.span(name):
+                yield
+        finally:
+            stats = None
+            snapshot = None
+            if profiler:
+                profiler.disable()
+                stats = pstats.Stats(profiler)
+            if capture and self.tracemalloc:
+                snapshot = tracemalloc.take_snapshot()
+                if started_tracemalloc:
+                    tracemalloc.stop()
+            if capture:
+                _capture_lock.release()
+                self._finish_run(name, stats, snapshot)
+
+    def _finish_run(self, name: str, stats: typing.Optional[pstats.Stats], snapshot: typing.Optional[tracemalloc.Snapshot]):
+        ''' Writes out (if requested) and hands the captured run data to callbacks '''
+        if self.output_directory:
+            self.output_directory.mkdir(parents=True, exist_ok=True)
+            base = f'{pathlib.Path(name).name}_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")}'
+            if stats:
+                stats.dump_stats(str(self.output_directory / f'{base}.prof'))
+            if snapshot:
+                snapshot.dump(str(self.output_directory / f'{base}.snapshot'))
+
+        for callback in self._run_callbacks:
+            callback(name, stats, snapshot)
@@ -0,0 +1,107 @@
+import pathlib
+import pstats
+import pytest
+import tracemalloc
+
+from auto.tracing import Tracer, Span
+from unittest.mock import MagicMock
+
+def test_tracer_disabled_is_a_no_op():
+    tracer = Tracer(enable=False, profile=True, tracemalloc=True)
+    callback = MagicMock()
+    tracer.add_span_callback(callback)
+    tracer.add_run_callback(callback)
+
+    # the same null context is handed back each time
+    assert tracer.span('a') is tracer.span('b')
+    with tracer.run('run'):
+        with tracer.span('a'):
+            pass
+    tracer.record('b', 0, 1)
+
+    assert not tracer.profile
+    assert not tracer.tracemalloc
+    assert len(tracer.recent_spans) == 0
+    callback.assert_not_called()
+
+def test_tracer_span_calls_callbacks():
+    tracer = Tracer(enable=True)
+    spans = []
+    tracer.add_span_callback(spans.append)
+
+    with tracer.span('a'):
+        pass
+
+    with pytest.raises(ValueError):
+        with tracer.span('b'):
+            raise ValueError()
+
+    assert [s.name for s in spans] == ['a', 'b']
+    assert all(isinstance(s, Span) and s.duration >= 0 for s in spans)
+    assert list(tracer.recent_spans) == spans
+
+def test_tracer_record():
+    tracer = Tracer(enable=True)
+    tracer.record('a', 1, 3)
+    assert tracer.recent_spans[-1] == Span('a', 1, 3, 2)
+
+    tracer.record('b', 1, 3, .5)
+    assert tracer.recent_spans[-1] == Span('b', 1, 3, .5)
+
+def test_tracer_run_without_capture_only_spans():
+    tracer = Tracer(enable=True)
+    run_callback = MagicMock()
+    tracer.add_run_callback(run_callback)
+
+    with tracer.run('run'):
+        pass
+
+    assert tracer.recent_spans[-1].name == 'run'
+    run_callback.assert_not_called()
+
+def test_tracer_run_with_profile_and_tracemalloc(tmpdir):
+    tracer = Tracer(enable=True, profile=True, tracemalloc=True, output_directory=str(tmpdir))
+    results = []
+    tracer.add_run_callback(lambda *args: results.append(args))
+
+    with tracer.run('some/path/script.py'):
+        sum(range(100))
+
+    assert len(results) == 1
+    name, stats, snapshot = results[0]
+    assert name == 'some/path/script.py'
+    assert isinstance(stats, pstats.Stats)
+    assert isinstance(snapshot, tracemalloc.Snapshot)
+    assert not tracemalloc.is_tracing()
+
+    out = pathlib.Path(tmpdir)
+    assert len(list(out.glob('script.py_*.prof'))) == 1
+    assert len(list(out.glob('script.py_*.snapshot'))) == 1
+
+def test_tracer_from_config():
+    tracer = Tracer.from_config({'enable': True, 'profile': True, 'tracemalloc': False, 'output_directory': None})
+    assert tracer.enable
+    assert tracer.profile
+    assert not tracer.tracemalloc
+    assert tracer.output_directory is None
+
+    tracer = Tracer.from_config({})
+    assert not tracer.enable
+
+def test_tracer_runs_only_capture_one_at_a_time_across_tracers():
+    tracer_a = Tracer(enable=True, profile=True, tracemalloc=True)
+    tracer_b = Tracer(enable=True, profile=True, tracemalloc=True)
+    results_a = []
+    results_b = []
+    tracer_a.add_run_callback(lambda *args: results_a.append(args))
+    tracer_b.add_run_callback(lambda *args: results_b.append(args))
+
+    with tracer_a.run('a'):
+        # b overlaps a, so it only gets a span
+        with tracer_b.run('b'):
+            pass
+
+    assert len(results_a) == 1
+    assert results_b == []
+    assert tracer_b.recent_spans[-1].name == 'b'
+    assert not tracemalloc.is_tracing()